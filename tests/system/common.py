@@ -1,4 +1,9 @@
 """ """
+import copy
+import os
+import time
+import uuid
+
 from shakedown import *
 from utils import *
 from dcos.errors import DCOSException
@@ -32,7 +37,46 @@ def unique_host_constraint():
     return constraints('hostname', 'UNIQUE')
 
 
-def group():
+def worker_id():
+    """Gets the pytest-xdist worker running the tests, 'local' when the tests
+    are not distributed"""
+
+    return os.environ.get('PYTEST_XDIST_WORKER', 'local')
+
+
+def worker_app_id(name):
+    """Namespaces name with the xdist worker, parallel workers never share
+    an app"""
+
+    return '{}-{}'.format(name, worker_id())
+
+
+def unique_app_id(name):
+    """Gives name a unique suffix, namespaced with the xdist worker"""
+
+    return worker_app_id('{}-{}'.format(name, uuid.uuid4().hex))
+
+
+def is_worker_app_id(app_id):
+    suffix = '-{}'.format(worker_id())
+    return any(segment.endswith(suffix) for segment in app_id.split('/'))
+
+
+def agents_reachable():
+    """Whether the agents are routable from the test driver, set
+    AGENTS_REACHABLE=0 to go through ssh on restricted networks"""
+
+    return os.environ.get('AGENTS_REACHABLE', '1') == '1'
+
+
+def mesos_dns_reachable():
+    """Whether the test driver resolves *.mesos names through mesos-dns, set
+    MESOS_DNS_REACHABLE=1 when it does"""
+
+    return os.environ.get('MESOS_DNS_REACHABLE', '0') == '1'
+
+
+def group(group_id='/test-group'):
 
     return {
         "apps": [],
@@ -45,7 +89,7 @@ def group():
                         "cpus": 1.0,
                         "dependencies": [],
                         "disk": 0.0,
-                        "id": "/test-group/sleep/goodnight",
+                        "id": group_id + "/sleep/goodnight",
                         "instances": 1,
                         "mem": 128.0
                     },
@@ -54,20 +98,88 @@ def group():
                         "cpus": 1.0,
                         "dependencies": [],
                         "disk": 0.0,
-                        "id": "/test-group/sleep/goodnight2",
+                        "id": group_id + "/sleep/goodnight2",
                         "instances": 1,
                         "mem": 128.0
                     }
                 ],
                 "dependencies": [],
                 "groups": [],
-                "id": "/test-group/sleep",
+                "id": group_id + "/sleep",
             }
         ],
-        "id": "/test-group"
+        "id": group_id
     }
 
 
+def marathon_api_url(base_url, path):
+    """Joins the service url of a marathon, e.g.
+    dcos_service_url('marathon-user'), with an api path"""
+
+    return '{}/{}'.format(base_url.rstrip('/'), path.lstrip('/'))
+
+
+def post_app(base_url, app_def):
+    """Creates app_def and returns the id of its deployment"""
+
+    url = marathon_api_url(base_url, 'v2/apps')
+    response = http.post(url, json=app_def)
+    return parse_json(response)['deployments'][0]['id']
+
+
+def post_group(base_url, group_def):
+    """Creates group_def and returns the id of its deployment, the dcos client
+    create_group returns a different shape depending on its version"""
+
+    url = marathon_api_url(base_url, 'v2/groups')
+    response = http.post(url, json=group_def)
+    return parse_json(response)['deploymentId']
+
+
+def get_group_full(base_url, group_id):
+    """Gets group_id with its apps and their tasks embedded, in a single
+    request"""
+
+    url = marathon_api_url(base_url, 'v2/groups{}'.format(group_id))
+    # an explicit embed replaces the default one, group.apps is required for
+    # the apps to be included at all
+    params = {'embed': ['group.apps', 'group.apps.tasks']}
+    response = http.get(url, params=params)
+    return parse_json(response)
+
+
+def get_group_with_tasks(base_url, group_id):
+    """Gets the apps of group_id keyed by their name within the group, each
+    app includes its tasks"""
+
+    group = get_group_full(base_url, group_id)
+    return {app['id'].split('/')[-1]: app for app in group['apps']}
+
+
+def delete_group(base_url, group_id, force=True):
+    """Removes group_id and returns the id of the removal deployment, or None
+    if marathon refused or has no such group"""
+
+    url = marathon_api_url(base_url, 'v2/groups{}'.format(group_id))
+    params = {'force': 'true'} if force else None
+    try:
+        response = http.delete(url, params=params)
+    except DCOSException:
+        return None
+
+    return parse_json(response)['deploymentId']
+
+
+def delete_worker_groups(base_url):
+    """Removes the top level groups of the current xdist worker without
+    waiting for the removal"""
+
+    response = http.get(marathon_api_url(base_url, 'v2/groups'))
+    for group in parse_json(response)['groups']:
+        if is_worker_app_id(group['id']):
+            delete_group(base_url, group['id'])
+
+
 def python_http_app():
     return {
         'id': 'python-http',
@@ -79,6 +191,61 @@ def python_http_app():
         }
 
 
+# copied by app_docker() and app_mesos(), tests only change the top level
+# keys and the container
+_APP_DOCKER_TEMPLATE = {
+    'id': 'docker-test',
+    'cmd': 'python3 -m http.server 8080',
+    'cpus': 0.5,
+    'mem': 32.0,
+    'container': {
+        'type': 'DOCKER',
+        'docker': {
+            'image': 'python:3',
+            'network': 'BRIDGE',
+            'portMappings': [
+                {'containerPort': 8080, 'hostPort': 0}
+            ]
+        }
+    }
+}
+
+_APP_MESOS_TEMPLATE = {
+    'id': 'mesos-test',
+    'cmd': 'sleep 1000',
+    'cpus': 0.5,
+    'mem': 32.0,
+    'container': {
+        'type': 'MESOS'
+    }
+}
+
+
+def app_docker():
+    app = dict(_APP_DOCKER_TEMPLATE)
+    app['id'] = unique_app_id(app['id'])
+    app['container'] = copy.deepcopy(app['container'])
+    return app
+
+
+def app_mesos():
+    app = dict(_APP_MESOS_TEMPLATE)
+    app['id'] = unique_app_id(app['id'])
+    app['container'] = copy.deepcopy(app['container'])
+    return app
+
+
+def remove_apps(client, app_ids):
+    """Removes app_ids without waiting for the removal, for ids unique per
+    test which are never reused"""
+
+    for app_id in app_ids:
+        try:
+            client.remove_app(app_id, True)
+        except DCOSException:
+            pass
+
+
 def pin_to_host(app_def, host):
     app_def['constraints'] = constraints('hostname', 'LIKE', host)
 
@@ -127,24 +294,79 @@ def delete_all_apps_wait():
     deployment_wait()
 
 
-def deployment_wait(timeout=120):
+def delete_worker_apps_wait():
+    """Removes only the apps of the current xdist worker and waits for their
+    removal, the apps of other workers are left running"""
+
+    client = marathon.create_client()
+    app_ids = [app['id'] for app in client.get_apps()
+               if is_worker_app_id(app['id'])]
+    for app_id in app_ids:
+        client.remove_app(app_id, True)
+
+    def removed():
+        return not any(app['id'] in app_ids for app in client.get_apps())
+
+    if not wait_until(removed):
+        raise DCOSException("timeout on removal of {}".format(app_ids))
+
+
+def wait_until(predicate, timeout=120, interval=0.2):
+    """Polls predicate until it returns a truthy value, returns true on
+    success and false on expiration of timeout"""
+
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(interval)
+
+    return True
+
+
+def has_deployment(deployment_id, client=None):
+    if client is None:
+        client = marathon.create_client()
+    deployments = client.get_deployments()
+    return any(deployment['id'] == deployment_id for deployment in deployments)
+
+
+def deployment_wait(timeout=120, deployment_id=None, appear_timeout=2):
+    """Waits for all deployments, or only for the given deployment_id, to
+    finish"""
+
     client = marathon.create_client()
     start = time.time()
-    deployment_count = 1
-    # TODO: time limit with fail
-    while deployment_count > 0:
-        deployments = client.get_deployments()
-        deployment_count = len(deployments)
-        end = time.time()
-        elapse = round(end - start, 3)
-        if elapse > timeout:
-            raise DCOSException("timeout on deployment wait: {}".format(elapse))
+
+    if deployment_id is None:
+        def done():
+            return len(client.get_deployments()) == 0
+    else:
+        # a deployment just started may not be listed yet, without this the
+        # wait below could return before it even began
+        wait_until(lambda: has_deployment(deployment_id, client),
+                   appear_timeout)
+
+        def done():
+            return not has_deployment(deployment_id, client)
+
+    if not wait_until(done, timeout):
+        elapse = round(time.time() - start, 3)
+        raise DCOSException("timeout on deployment wait: {}".format(elapse))
 
     end = time.time()
     elapse = round(end - start, 3)
     return elapse
 
 
+def last_task_failure(client, app_id):
+    """Returns the message of the last task failure of app_id, or an empty
+    string if no task has failed yet"""
+
+    app = client.get_app(app_id)
+    return app.get('lastTaskFailure', {}).get('message', '')
+
+
 def ip_other_than_mom():
     mom_ip = ip_of_mom()
 
@@ -163,15 +385,17 @@ def ip_of_mom():
 
 
 def ensure_mom():
-    if not is_mom_installed():
-        install_package_and_wait('marathon')
-        deployment_wait()
-        end_time = time.time() + 120
-        while time.time() < end_time:
-            if service_healthy('marathon-user'):
-                break
-            time.sleep(1)
-
+    # the first xdist worker taking the lock installs MoM, the others find it
+    # installed once they get the lock
+    with file_lock('marathon-mom-install.lock'):
+        if not is_mom_installed():
+            install_package_and_wait('marathon')
+            deployment_wait()
+            end_time = time.time() + 120
+            while time.time() < end_time:
+                if service_healthy('marathon-user'):
+                    break
+                time.sleep(1)
         if not wait_for_service_url('marathon-user'):
             print('ERROR: Timeout waiting for endpoint')
 
@@ -0,0 +1,18 @@
+"""pytest configuration of the marathon system tests"""
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'xdist_group(name): runs the tests of a group on the same xdist worker, '
+        'needs --dist loadgroup of pytest-xdist >= 2.5')
+
+    # without loadgroup xdist silently ignores the groups and the pinned host
+    # tests of different workers place their tasks on the same agent
+    numprocesses = config.getoption('numprocesses', None)
+    dist = config.getoption('dist', 'no')
+    if numprocesses and dist != 'loadgroup':
+        raise pytest.UsageError(
+            "the system tests need --dist loadgroup (pytest-xdist >= 2.5) "
+            "when run with -n, got --dist {}".format(dist))
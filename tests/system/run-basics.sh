@@ -0,0 +1,20 @@
+#!/bin/bash
+
+# Runs test_marathon_basics.py in the two phases it needs: distributed over
+# pytest-xdist workers, then the tests needing the pinned agent to themselves
+# without xdist. Extra arguments are passed to both pytest runs. Fails if
+# either phase fails.
+
+cd $(dirname $0)
+
+EXCLUSIVE="does_not_scale_to_unpinned_host or does_not_find_unknown_host"
+
+pytest -n auto --dist loadgroup "$@" test_marathon_basics.py
+DISTRIBUTED=$?
+
+pytest "$@" -k "$EXCLUSIVE" test_marathon_basics.py
+EXCLUSIVE_STATUS=$?
+
+if [[ $DISTRIBUTED -ne 0 || $EXCLUSIVE_STATUS -ne 0 ]]; then
+  exit 1
+fi
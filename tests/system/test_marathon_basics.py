@@ -1,8 +1,9 @@
 """Marathon tests on DC/OS for negative conditions"""
 
 import pytest
+import requests
+import socket
 import time
-import uuid
 
 from common import *
 from shakedown import *
@@ -10,68 +11,49 @@ from utils import *
 from dcos import *
 
 
-def test_launch_mesos_container():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_mesos())
-        deployment_wait()
-
-        tasks = client.get_tasks('/mesos-test')
-        app = client.get_app('/mesos-test')
-
-        assert len(tasks) == 1
-        assert app['container']['type'] == 'MESOS'
-
+# tests placing tasks on the host of ip_other_than_mom(), or using a lot of
+# cpu anywhere, run on a single xdist worker with --dist loadgroup
+pinned_host = pytest.mark.xdist_group(name='pinned_host')
 
-def test_launch_docker_container():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_docker())
-        deployment_wait()
+# the pinned host only fits a single task of these tests, under xdist the
+# apps of other workers can land on it as well
+node_exclusive = pytest.mark.skipif(
+    worker_id() != 'local',
+    reason='needs the pinned host to itself, run without xdist')
 
-        tasks = client.get_tasks('/docker-test')
-        app = client.get_app('/docker-test')
 
-        assert len(tasks) == 1
-        assert app['container']['type'] == 'DOCKER'
+def test_launch_mesos_container(mom_client, mom_url, created_apps):
+    app_def = app_mesos()
+    app_id = app_def['id']
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
+    tasks = mom_client.get_tasks(app_id)
+    app = mom_client.get_app(app_id)
 
-def test_launch_mesos_mom_graceperiod():
-    app_def = app_mesos()
-    app_def['id'] = 'grace'
-    app_def['taskKillGracePeriodSeconds'] = 20
-    fetch = [{
-            "uri": "https://downloads.mesosphere.com/testing/test.py"
-    }]
-    app_def['fetch'] = fetch
-    app_def['cmd'] = '/opt/mesosphere/bin/python test.py'
+    assert len(tasks) == 1
+    assert app['container']['type'] == 'MESOS'
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
 
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
+def test_launch_docker_container(mom_client, mom_url, created_apps):
+    app_def = app_docker()
+    app_id = app_def['id']
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-        client.scale_app('/grace', 0)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
+    tasks = mom_client.get_tasks(app_id)
+    app = mom_client.get_app(app_id)
 
-        # 3 sec is the default
-        # should have task still
-        time.sleep(5)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
-        time.sleep(20)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is None
+    assert len(tasks) == 1
+    assert app['container']['type'] == 'DOCKER'
 
 
-def test_launch_mesos_root_marathon_graceperiod():
-    delete_all_apps_wait()
+def test_launch_mesos_mom_graceperiod(mom_client, mom_url, created_apps):
     app_def = app_mesos()
-    app_def['id'] = 'grace'
+    app_def['id'] = unique_app_id('grace')
+    app_id = app_def['id']
     app_def['taskKillGracePeriodSeconds'] = 20
     fetch = [{
             "uri": "https://downloads.mesosphere.com/testing/test.py"
@@ -79,122 +61,102 @@ def test_launch_mesos_root_marathon_graceperiod():
     app_def['fetch'] = fetch
     app_def['cmd'] = '/opt/mesosphere/bin/python test.py'
 
-    client = marathon.create_client()
-    client.add_app(app_def)
-    deployment_wait()
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-    tasks = get_service_task('marathon', 'grace')
+    tasks = get_service_task('marathon-user', app_id)
     assert tasks is not None
 
-    client.scale_app('/grace', 0)
-    tasks = get_service_task('marathon', 'grace')
+    mom_client.scale_app(app_id, 0)
+    tasks = get_service_task('marathon-user', app_id)
     assert tasks is not None
 
     # 3 sec is the default
     # should have task still
     time.sleep(5)
-    tasks = get_service_task('marathon', 'grace')
+    tasks = get_service_task('marathon-user', app_id)
     assert tasks is not None
-    time.sleep(20)
-    tasks = get_service_task('marathon', 'grace')
-    assert tasks is None
-
-
-def test_launch_mesos_mom_default_graceperiod():
-    app_def = app_mesos()
-    app_def['id'] = 'grace'
-    fetch = [{
-            "uri": "https://downloads.mesosphere.com/testing/test.py"
-    }]
-    app_def['fetch'] = fetch
-    app_def['cmd'] = '/opt/mesosphere/bin/python test.py'
-
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
-
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
-
-        client.scale_app('/grace', 0)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
-
-        # 3 sec is the default
-        # should have task still
-        time.sleep(5)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is None
+    assert wait_until(lambda: get_service_task('marathon-user', app_id) is None, 20)
 
 
-def test_launch_mesos_root_marathon_default_graceperiod():
-    delete_all_apps_wait()
+def test_launch_mesos_mom_default_graceperiod(mom_client, mom_url, created_apps):
     app_def = app_mesos()
-    app_def['id'] = 'grace'
+    app_def['id'] = unique_app_id('grace')
+    app_id = app_def['id']
     fetch = [{
             "uri": "https://downloads.mesosphere.com/testing/test.py"
     }]
     app_def['fetch'] = fetch
     app_def['cmd'] = '/opt/mesosphere/bin/python test.py'
 
-    # with marathon_on_marathon():
-    client = marathon.create_client()
-    client.add_app(app_def)
-    deployment_wait()
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-    tasks = get_service_task('marathon', 'grace')
+    tasks = get_service_task('marathon-user', app_id)
     assert tasks is not None
 
-    client.scale_app('/grace', 0)
-    tasks = get_service_task('marathon', 'grace')
+    mom_client.scale_app(app_id, 0)
+    tasks = get_service_task('marathon-user', app_id)
     assert tasks is not None
 
     # 3 sec is the default
     # should have task still
-    time.sleep(5)
-    tasks = get_service_task('marathon', 'grace')
-    assert tasks is None
+    assert wait_until(lambda: get_service_task('marathon-user', app_id) is None, 5)
 
 
-def test_launch_docker_mom_graceperiod():
+def test_launch_docker_mom_graceperiod(mom_client, mom_url, created_apps):
     app_def = app_docker()
-    app_def['id'] = 'grace'
+    app_def['id'] = unique_app_id('grace')
+    app_id = app_def['id']
     app_def['container']['docker']['image'] = 'kensipe/python-test'
     app_def['taskKillGracePeriodSeconds'] = 20
     app_def['cmd'] = 'python test.py'
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
-
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-        client.scale_app('/grace', 0)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
+    tasks = get_service_task('marathon-user', app_id)
+    assert tasks is not None
 
-        # 3 sec is the default
-        # should have task still
-        time.sleep(5)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is not None
-        time.sleep(20)
-        tasks = get_service_task('marathon-user', 'grace')
-        assert tasks is None
+    mom_client.scale_app(app_id, 0)
+    tasks = get_service_task('marathon-user', app_id)
+    assert tasks is not None
 
+    # 3 sec is the default
+    # should have task still
+    time.sleep(5)
+    tasks = get_service_task('marathon-user', app_id)
+    assert tasks is not None
+    assert wait_until(lambda: get_service_task('marathon-user', app_id) is None, 20)
 
-def test_docker_port_mappings():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_docker())
-        deployment_wait()
 
-        tasks = client.get_tasks('/docker-test')
-        host = tasks[0]['host']
-        port = tasks[0]['ports'][0]
+def test_docker_port_mappings(mom_client, mom_url, created_apps):
+    app_def = app_docker()
+    app_id = app_def['id']
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
+
+    tasks = mom_client.get_tasks(app_id)
+    host = tasks[0]['host']
+    port = tasks[0]['ports'][0]
+
+    if agents_reachable():
+        url = 'http://{}:{}/.dockerenv'.format(host, port)
+
+        # the http server may not be listening yet
+        def dockerenv_served():
+            try:
+                response = requests.get(url, timeout=5)
+            except requests.exceptions.RequestException:
+                return False
+            return response.status_code == 200
+
+        assert wait_until(dockerenv_served, 10, 1)
+    else:
         cmd = r'curl -s -w "%{http_code}"'
         cmd = cmd + ' {}:{}/.dockerenv'.format(host, port)
         status, output = run_command_on_agent(host, cmd)
@@ -203,38 +165,48 @@ def test_docker_port_mappings():
         assert output == "200"
 
 
-def test_docker_dns_mapping():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        app_name = uuid.uuid4().hex
-        app_json = app_docker()
-        app_json['id'] = app_name
-        client.add_app(app_json)
-        deployment_wait()
-
-        tasks = client.get_tasks(app_name)
-        host = tasks[0]['host']
-
-        time.sleep(5)
-        bad_cmd = 'ping -c 1 docker-test.marathon-user.mesos-bad'
-        cmd = 'ping -c 1 {}.marathon-user.mesos'.format(app_name)
-        status, output = run_command_on_agent(host, bad_cmd)
-        assert not status
+def test_docker_dns_mapping(mom_client, mom_url, created_apps):
+    app_json = app_docker()
+    app_name = app_json['id']
+    created_apps.append(app_json['id'])
+    deployment_id = post_app(mom_url, app_json)
+    deployment_wait(deployment_id=deployment_id)
 
-        status, output = run_command_on_agent(host, cmd)
-        assert status
+    tasks = mom_client.get_tasks(app_name)
+    host = tasks[0]['host']
 
-        client.remove_app(app_name)
+    bad_name = 'docker-test.marathon-user.mesos-bad'
+    name = '{}.marathon-user.mesos'.format(app_name)
 
+    if mesos_dns_reachable():
+        def dns_resolves():
+            try:
+                socket.gethostbyname(name)
+            except socket.gaierror:
+                return False
+            return True
 
-def test_launch_app_timed():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_mesos())
-        # if not launched in 3 sec fail
-        time.sleep(3)
-        tasks = client.get_tasks('/mesos-test')
-        assert len(tasks) == 1
+        with pytest.raises(socket.gaierror):
+            socket.gethostbyname(bad_name)
+    else:
+        def dns_resolves():
+            status, output = run_command_on_agent(host, 'ping -c 1 ' + name)
+            return status
+
+        status, output = run_command_on_agent(host, 'ping -c 1 ' + bad_name)
+        assert not status
+
+    # mesos-dns needs a moment to pick up the new task
+    assert wait_until(dns_resolves, 10, 1)
+
+
+def test_launch_app_timed(mom_client, created_apps):
+    app_def = app_mesos()
+    app_id = app_def['id']
+    created_apps.append(app_def['id'])
+    mom_client.add_app(app_def)
+    # if not launched in 3 sec fail
+    assert wait_until(lambda: len(mom_client.get_tasks(app_id)) == 1, 3)
 
 
 def test_ui_registration_requirement():
@@ -255,58 +227,51 @@ def test_ui_available():
     assert response.status_code == 200
 
 
-def test_task_failure_recovers():
-    app_def = app()
+def test_task_failure_recovers(mom_client, mom_url, created_apps):
+    app_def = app(unique_app_id('task-failure'))
     app_id = app_def['id']
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
-        tasks = client.get_tasks(app_id)
-        host = tasks[0]['host']
-        kill_process_on_host(host, '[s]leep')
-        deployment_wait()
-        time.sleep(1)
-        new_tasks = client.get_tasks(app_id)
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
+    tasks = mom_client.get_tasks(app_id)
+    host = tasks[0]['host']
+    kill_process_on_host(host, '[s]leep')
+
+    def task_replaced():
+        new_tasks = mom_client.get_tasks(app_id)
+        return len(new_tasks) == 1 and new_tasks[0]['id'] != tasks[0]['id']
 
-        assert tasks[0]['id'] != new_tasks[0]['id']
+    assert wait_until(task_replaced, 30)
 
 
-def test_good_user():
-    app_def = app()
+def test_good_user(mom_client, mom_url, created_apps):
+    app_def = app(unique_app_id('good-user'))
     app_id = app_def['id']
     app_def['user'] = 'core'
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
-        tasks = client.get_tasks(app_id)
-        deployment_wait()
-        time.sleep(1)
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
+    tasks = mom_client.get_tasks(app_id)
 
-        assert tasks[0]['id'] != app_def['id']
+    assert tasks[0]['id'] != app_def['id']
 
 
-def test_bad_user():
-    app_def = app()
+def test_bad_user(mom_client, created_apps):
+    app_def = app(unique_app_id('bad-user'))
     app_id = app_def['id']
     app_def['user'] = 'bad'
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        time.sleep(2)
+    created_apps.append(app_def['id'])
+    mom_client.add_app(app_def)
 
-        appl = client.get_app(app_id)
-        message = appl['lastTaskFailure']['message']
-        error = "Failed to get user information for 'bad'"
-        assert error in message
+    error = "Failed to get user information for 'bad'"
+    assert wait_until(lambda: error in last_task_failure(mom_client, app_id), 10)
 
 
-def test_bad_uri():
-    app_def = app()
+def test_bad_uri(mom_client, created_apps):
+    app_def = app(unique_app_id('bad-uri'))
     app_id = app_def['id']
     fetch = [{
       "uri": "http://mesosphere.io/missing-artifact"
@@ -314,306 +279,286 @@ def test_bad_uri():
 
     app_def['fetch'] = fetch
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        # can't deployment_wait
-        # need time to fail at least once
-        time.sleep(4)
+    created_apps.append(app_def['id'])
+    mom_client.add_app(app_def)
+    # can't deployment_wait
+    # need time to fail at least once
+    error = "Failed to fetch all URIs for container"
+    assert wait_until(lambda: error in last_task_failure(mom_client, app_id), 10)
 
-        appl = client.get_app(app_id)
-        message = appl['lastTaskFailure']['message']
-        error = "Failed to fetch all URIs for container"
-        assert error in message
 
-        client.remove_app(app_id)
+@pinned_host
+def test_launch_group(mom_client, mom_url, created_groups):
+    group_id = '/' + unique_app_id('test-group')
+    created_groups.append(group_id)
 
+    deployment_id = post_group(mom_url, group(group_id))
+    deployment_wait(deployment_id=deployment_id)
 
-def test_launch_group():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        try:
-            client.remove_group('/')
-            deployment_wait()
-        except Exception as e:
-            pass
+    group_apps = get_group_full(mom_url, group_id + '/sleep')
+    apps = group_apps['apps']
+    assert len(apps) == 2
+    for app in apps:
+        assert 'tasks' in app
 
-        client.create_group(group())
-        deployment_wait()
 
-        group_apps = client.get_group('/test-group/sleep')
-        apps = group_apps['apps']
-        assert len(apps) == 2
+@pinned_host
+def test_scale_group(mom_client, mom_url, created_groups):
+    group_id = '/' + unique_app_id('test-group')
+    created_groups.append(group_id)
 
+    deployment_id = post_group(mom_url, group(group_id))
+    deployment_wait(deployment_id=deployment_id)
 
-def test_scale_group():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        try:
-            client.remove_group('/test-group', True)
-            deployment_wait()
-        except Exception as e:
-            pass
-
-        client.create_group(group())
-        deployment_wait()
-
-        group_apps = client.get_group('/test-group/sleep')
-        apps = group_apps['apps']
-        assert len(apps) == 2
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 1
-        assert len(tasks2) == 1
-
-        client.scale_group('/test-group/sleep', 2)
-        deployment_wait()
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 2
-        assert len(tasks2) == 2
-
-
-def test_scale_app_in_group():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        try:
-            client.remove_group('/test-group', True)
-            deployment_wait()
-        except Exception as e:
-            pass
-
-        client.create_group(group())
-        deployment_wait()
-
-        group_apps = client.get_group('/test-group/sleep')
-        apps = group_apps['apps']
-        assert len(apps) == 2
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 1
-        assert len(tasks2) == 1
-
-        client.scale_app('/test-group/sleep/goodnight', 2)
-        deployment_wait()
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 2
-        assert len(tasks2) == 1
-
-
-def test_scale_app_in_group_then_group():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        try:
-            client.remove_group('/test-group', True)
-            deployment_wait()
-        except Exception as e:
-            pass
-
-        client.create_group(group())
-        deployment_wait()
-
-        group_apps = client.get_group('/test-group/sleep')
-        apps = group_apps['apps']
-        assert len(apps) == 2
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 1
-        assert len(tasks2) == 1
-
-        client.scale_app('/test-group/sleep/goodnight', 2)
-        deployment_wait()
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 2
-        assert len(tasks2) == 1
-
-        client.scale_group('/test-group/sleep', 2)
-        deployment_wait()
-        time.sleep(1)
-        tasks1 = client.get_tasks('/test-group/sleep/goodnight')
-        tasks2 = client.get_tasks('/test-group/sleep/goodnight2')
-        assert len(tasks1) == 4
-        assert len(tasks2) == 2
-
-
-def test_health_check_healthy():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        app_def = python_http_app()
-        app_def['id'] = 'no-health'
-        client.add_app(app_def)
-        deployment_wait()
+    apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+    assert len(apps) == 2
+    assert len(apps['goodnight']['tasks']) == 1
+    assert len(apps['goodnight2']['tasks']) == 1
 
-        app = client.get_app('/no-health')
+    deployment_id = mom_client.scale_group(group_id + '/sleep', 2)
+    deployment_wait(deployment_id=deployment_id)
+    apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+    assert len(apps['goodnight']['tasks']) == 2
+    assert len(apps['goodnight2']['tasks']) == 2
 
-        assert app['tasksRunning'] == 1
-        assert app['tasksHealthy'] == 0
 
-        client.remove_app('/no-health')
-        health_list = []
-        health_list.append(health_check())
-        app_def['id'] = 'healthy'
-        app_def['healthChecks'] = health_list
+@pinned_host
+def test_scale_app_in_group(mom_client, mom_url, created_groups):
+    group_id = '/' + unique_app_id('test-group')
+    created_groups.append(group_id)
 
-        client.add_app(app_def)
-        deployment_wait()
+    deployment_id = post_group(mom_url, group(group_id))
+    deployment_wait(deployment_id=deployment_id)
 
-        app = client.get_app('/healthy')
+    apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+    assert len(apps) == 2
+    assert len(apps['goodnight']['tasks']) == 1
+    assert len(apps['goodnight2']['tasks']) == 1
 
-        assert app['tasksRunning'] == 1
-        assert app['tasksHealthy'] == 1
+    deployment_id = mom_client.scale_app(group_id + '/sleep/goodnight', 2)
+    deployment_wait(deployment_id=deployment_id)
+    apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+    assert len(apps['goodnight']['tasks']) == 2
+    assert len(apps['goodnight2']['tasks']) == 1
 
 
-def test_health_check_unhealthy():
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        app_def = python_http_app()
-        health_list = []
-        health_list.append(health_check('/bad-url', 0, 0))
-        app_def['id'] = 'unhealthy'
-        app_def['healthChecks'] = health_list
+@pinned_host
+def test_scale_app_in_group_then_group(mom_client, mom_url, created_groups):
+    group_id = '/' + unique_app_id('test-group')
+    created_groups.append(group_id)
+
+    deployment_id = post_group(mom_url, group(group_id))
+    deployment_wait(deployment_id=deployment_id)
+
+    apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+    assert len(apps) == 2
+    assert len(apps['goodnight']['tasks']) == 1
+    assert len(apps['goodnight2']['tasks']) == 1
+
+    deployment_id = mom_client.scale_app(group_id + '/sleep/goodnight', 2)
+    deployment_wait(deployment_id=deployment_id)
+    apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+    assert len(apps['goodnight']['tasks']) == 2
+    assert len(apps['goodnight2']['tasks']) == 1
+
+    deployment_id = mom_client.scale_group(group_id + '/sleep', 2)
+    deployment_wait(deployment_id=deployment_id)
+
+    def group_scaled():
+        apps = get_group_with_tasks(mom_url, group_id + '/sleep')
+        return (len(apps['goodnight']['tasks']) == 4 and
+                len(apps['goodnight2']['tasks']) == 2)
+
+    assert wait_until(group_scaled, 10)
+
+
+def test_health_check_healthy(mom_client, mom_url, created_apps):
+    app_def = python_http_app()
+    app_def['id'] = unique_app_id('no-health')
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
+
+    app = mom_client.get_app(app_def['id'])
+
+    assert app['tasksRunning'] == 1
+    assert app['tasksHealthy'] == 0
 
-        client.add_app(app_def)
-        try:
-            deployment_wait(10)
-        except Exception as e:
-            pass
+    mom_client.remove_app(app_def['id'])
+    health_list = []
+    health_list.append(health_check())
+    app_def['id'] = unique_app_id('healthy')
+    app_def['healthChecks'] = health_list
 
-        app = client.get_app('/unhealthy')
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-        assert app['tasksRunning'] == 1
-        assert app['tasksHealthy'] == 0
-        assert app['tasksUnhealthy'] == 1
+    app = mom_client.get_app(app_def['id'])
 
+    assert app['tasksRunning'] == 1
+    assert app['tasksHealthy'] == 1
 
-def test_health_failed_check():
+
+def test_health_check_unhealthy(mom_client, created_apps):
+    app_def = python_http_app()
+    health_list = []
+    health_list.append(health_check('/bad-url', 0, 0))
+    app_def['id'] = unique_app_id('unhealthy')
+    app_id = app_def['id']
+    app_def['healthChecks'] = health_list
+
+    created_apps.append(app_def['id'])
+    mom_client.add_app(app_def)
+    # the deployment never finishes, wait for the failing health check
+    assert wait_until(lambda: mom_client.get_app(app_id)['tasksUnhealthy'] == 1, 10)
+
+    app = mom_client.get_app(app_id)
+
+    assert app['tasksRunning'] == 1
+    assert app['tasksHealthy'] == 0
+    assert app['tasksUnhealthy'] == 1
+
+
+@pinned_host
+def test_health_failed_check(mom_client, mom_url, created_apps):
     agents = get_private_agents()
     if len(agents) < 2:
         raise DCOSException("At least 2 agents required for this test")
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        app_def = python_http_app()
-        health_list = []
-        health_list.append(health_check())
-        app_def['id'] = 'healthy'
-        app_def['healthChecks'] = health_list
+    app_def = python_http_app()
+    health_list = []
+    health_list.append(health_check())
+    app_def['id'] = unique_app_id('healthy')
+    app_id = app_def['id']
+    app_def['healthChecks'] = health_list
+
+    pin_to_host(app_def, ip_other_than_mom())
 
-        pin_to_host(app_def, ip_other_than_mom())
+    print(app_def)
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-        print(app_def)
-        client.add_app(app_def)
-        deployment_wait()
+    app = mom_client.get_app(app_id)
 
-        app = client.get_app('/healthy')
+    assert app['tasksRunning'] == 1
+    assert app['tasksHealthy'] == 1
 
-        assert app['tasksRunning'] == 1
-        assert app['tasksHealthy'] == 1
+    tasks = mom_client.get_tasks(app_id)
+    host = tasks[0]['host']
+    port = tasks[0]['ports'][0]
 
-        tasks = client.get_tasks('/healthy')
-        host = tasks[0]['host']
-        port = tasks[0]['ports'][0]
+    # prefer to break at the agent (having issues)
+    mom_ip = ip_of_mom()
+    save_iptables(host)
+    block_port(host, port)
 
-        # prefer to break at the agent (having issues)
-        mom_ip = ip_of_mom()
-        save_iptables(host)
-        block_port(host, port)
-        time.sleep(7)
+    def task_killed():
+        task_ids = [task['id'] for task in mom_client.get_tasks(app_id)]
+        return tasks[0]['id'] not in task_ids
+
+    try:
+        assert wait_until(task_killed, 30)
+    finally:
         restore_iptables(host)
-        deployment_wait()
 
-        new_tasks = client.get_tasks('/healthy')
-        print(new_tasks)
-        assert new_tasks[0]['id'] != tasks[0]['id']
+    def task_replaced():
+        return len(mom_client.get_tasks(app_id)) == 1
+
+    assert wait_until(task_replaced, 30)
+    new_tasks = mom_client.get_tasks(app_id)
+    print(new_tasks)
+    assert new_tasks[0]['id'] != tasks[0]['id']
 
 
-def test_pinned_task_scales_on_host_only():
-    app_def = app('pinned')
+@pinned_host
+def test_pinned_task_scales_on_host_only(mom_client, mom_url, created_apps):
+    app_def = app(unique_app_id('pinned'))
+    app_id = app_def['id']
     host = ip_other_than_mom()
     pin_to_host(app_def, host)
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
 
-        tasks = client.get_tasks('/pinned')
-        assert len(tasks) == 1
-        assert tasks[0]['host'] == host
+    tasks = mom_client.get_tasks(app_id)
+    assert len(tasks) == 1
+    assert tasks[0]['host'] == host
 
-        client.scale_app('pinned', 10)
-        deployment_wait()
+    deployment_id = mom_client.scale_app(app_id, 10)
+    deployment_wait(deployment_id=deployment_id)
 
-        tasks = client.get_tasks('/pinned')
-        assert len(tasks) == 10
-        for task in tasks:
-            assert task['host'] == host
+    tasks = mom_client.get_tasks(app_id)
+    assert len(tasks) == 10
+    for task in tasks:
+        assert task['host'] == host
 
 
-def test_pinned_task_recovers_on_host():
-    app_def = app('pinned')
+@pinned_host
+def test_pinned_task_recovers_on_host(mom_client, mom_url, created_apps):
+    app_def = app(unique_app_id('pinned'))
+    app_id = app_def['id']
     host = ip_other_than_mom()
     pin_to_host(app_def, host)
 
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
-        tasks = client.get_tasks('/pinned')
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
+    tasks = mom_client.get_tasks(app_id)
 
-        kill_process_on_host(host, '[s]leep')
-        deployment_wait()
-        new_tasks = client.get_tasks('/pinned')
+    kill_process_on_host(host, '[s]leep')
 
-        assert tasks[0]['id'] != new_tasks[0]['id']
-        assert new_tasks[0]['host'] == host
+    def task_replaced():
+        new_tasks = mom_client.get_tasks(app_id)
+        return len(new_tasks) == 1 and new_tasks[0]['id'] != tasks[0]['id']
 
+    assert wait_until(task_replaced, 30)
+    new_tasks = mom_client.get_tasks(app_id)
+    assert new_tasks[0]['host'] == host
 
-def test_pinned_task_does_not_scale_to_unpinned_host():
-    app_def = app('pinned')
+
+@pinned_host
+@node_exclusive
+def test_pinned_task_does_not_scale_to_unpinned_host(mom_client, mom_url, created_apps):
+    app_def = app(unique_app_id('pinned'))
+    app_id = app_def['id']
     host = ip_other_than_mom()
     pin_to_host(app_def, host)
     # only 1 can fit on the node
     app_def['cpus'] = 3.5
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        deployment_wait()
-        tasks = client.get_tasks('/pinned')
-        client.scale_app('pinned', 2)
-        # typical deployments are sub 3 secs
-        time.sleep(5)
-        deployments = client.get_deployments()
-        tasks = client.get_tasks('/pinned')
-
-        assert len(deployments) == 1
-        assert len(tasks) == 1
-
-
-def test_pinned_task_does_not_find_unknown_host():
-    app_def = app('pinned')
+    created_apps.append(app_def['id'])
+    deployment_id = post_app(mom_url, app_def)
+    deployment_wait(deployment_id=deployment_id)
+    tasks = mom_client.get_tasks(app_id)
+    mom_client.scale_app(app_id, 2)
+    # typical deployments are sub 3 secs
+    time.sleep(5)
+    deployments = mom_client.get_deployments(app_id)
+    tasks = mom_client.get_tasks(app_id)
+
+    assert len(deployments) == 1
+    assert len(tasks) == 1
+
+
+@pinned_host
+@node_exclusive
+def test_pinned_task_does_not_find_unknown_host(mom_client, created_apps):
+    app_def = app(unique_app_id('pinned'))
+    app_id = app_def['id']
     host = ip_other_than_mom()
     pin_to_host(app_def, '10.255.255.254')
     # only 1 can fit on the node
     app_def['cpus'] = 3.5
-    with marathon_on_marathon():
-        client = marathon.create_client()
-        client.add_app(app_def)
-        # deploys are within secs
-        # assuming after 10 no tasks meets criteria
-        time.sleep(10)
-
-        tasks = client.get_tasks('/pinned')
-        assert len(tasks) == 0
+    created_apps.append(app_def['id'])
+    mom_client.add_app(app_def)
+    # deploys are within secs
+    # assuming after 10 no tasks meets criteria
+    time.sleep(10)
 
-        client.remove_app(app_def['id'])
-
-
-def setup_function(function):
-    with marathon_on_marathon():
-        delete_all_apps_wait()
+    tasks = mom_client.get_tasks(app_id)
+    assert len(tasks) == 0
 
 
 def setup_module(module):
@@ -622,40 +567,61 @@ def setup_module(module):
 
 
 def teardown_module(module):
+    # safety net for anything a test failed to record, other xdist workers
+    # may still be running their apps
     with marathon_on_marathon():
-        delete_all_apps_wait()
-
-
-def app_docker():
-
-    app = {
-        'id': 'docker-test',
-        'cmd': 'python3 -m http.server 8080',
-        'cpus': 0.5,
-        'mem': 32.0,
-        'container': {
-            'type': 'DOCKER',
-            'docker': {
-                'image': 'python:3',
-                'network': 'BRIDGE',
-                'portMappings': [
-                    {'containerPort': 8080, 'hostPort': 0}
-                ]
-            }
-        }
-    }
-    return app
-
-
-def app_mesos():
-
-    app = {
-        'id': 'mesos-test',
-        'cmd': 'sleep 1000',
-        'cpus': 0.5,
-        'mem': 32.0,
-        'container': {
-            'type': 'MESOS'
-        }
-    }
-    return app
+        if worker_id() == 'local':
+            delete_all_apps_wait()
+        else:
+            delete_worker_apps_wait()
+        delete_worker_groups(dcos_service_url('marathon-user'))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_dcos_config():
+    """Gives every xdist worker its own dcos config, marathon_on_marathon
+    would otherwise switch the marathon url of all workers at once"""
+
+    if worker_id() == 'local':
+        yield
+    else:
+        with private_dcos_config():
+            yield
+
+
+@pytest.fixture(scope="module")
+def mom_url():
+    """Service url of MoM, for the requests made without the dcos client"""
+
+    return dcos_service_url('marathon-user')
+
+
+@pytest.fixture(scope="module")
+def mom_client():
+    """Runs the module against MoM, marathon_on_marathon is entered once and
+    its client shared by all tests, the root marathon tests live in
+    test_root_marathon.py"""
+
+    with marathon_on_marathon():
+        yield marathon.create_client()
+
+
+@pytest.fixture
+def created_apps(mom_client):
+    """Collects the ids of the apps a test creates on MoM, exactly those are
+    removed after the test"""
+
+    app_ids = []
+    yield app_ids
+    remove_apps(mom_client, app_ids)
+
+
+@pytest.fixture
+def created_groups(mom_url):
+    """Collects the ids of the groups a test creates on MoM, exactly those
+    are removed after the test"""
+
+    group_ids = []
+    yield group_ids
+    for group_id in group_ids:
+        delete_group(mom_url, group_id)
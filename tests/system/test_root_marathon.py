@@ -1,8 +1,10 @@
 """Marathon acceptance tests for DC/OS."""
 
 import pytest
+import time
 from dcos import marathon
 
+from common import *
 from shakedown import *
 from utils import fixture_dir, get_resource
 
@@ -30,6 +32,75 @@ def test_default_user():
     assert run_command_on_agent(host, "ps aux | grep '[s]leep ' | awk '{if ($1 !=\"root\") exit 1;}'")
 
 
+def test_launch_mesos_root_marathon_graceperiod(root_created_apps):
+    app_def = app_mesos()
+    app_def['id'] = unique_app_id('grace')
+    app_id = app_def['id']
+    app_def['taskKillGracePeriodSeconds'] = 20
+    fetch = [{
+            "uri": "https://downloads.mesosphere.com/testing/test.py"
+    }]
+    app_def['fetch'] = fetch
+    app_def['cmd'] = '/opt/mesosphere/bin/python test.py'
+
+    client = marathon.create_client()
+    root_created_apps.append(app_def['id'])
+    deployment_id = post_app(DCOS_SERVICE_URL, app_def)
+    deployment_wait(deployment_id=deployment_id)
+
+    tasks = get_service_task('marathon', app_id)
+    assert tasks is not None
+
+    client.scale_app(app_id, 0)
+    tasks = get_service_task('marathon', app_id)
+    assert tasks is not None
+
+    # 3 sec is the default
+    # should have task still
+    time.sleep(5)
+    tasks = get_service_task('marathon', app_id)
+    assert tasks is not None
+    assert wait_until(lambda: get_service_task('marathon', app_id) is None, 20)
+
+
+def test_launch_mesos_root_marathon_default_graceperiod(root_created_apps):
+    app_def = app_mesos()
+    app_def['id'] = unique_app_id('grace')
+    app_id = app_def['id']
+    fetch = [{
+            "uri": "https://downloads.mesosphere.com/testing/test.py"
+    }]
+    app_def['fetch'] = fetch
+    app_def['cmd'] = '/opt/mesosphere/bin/python test.py'
+
+    # with marathon_on_marathon():
+    client = marathon.create_client()
+    root_created_apps.append(app_def['id'])
+    deployment_id = post_app(DCOS_SERVICE_URL, app_def)
+    deployment_wait(deployment_id=deployment_id)
+
+    tasks = get_service_task('marathon', app_id)
+    assert tasks is not None
+
+    client.scale_app(app_id, 0)
+    tasks = get_service_task('marathon', app_id)
+    assert tasks is not None
+
+    # 3 sec is the default
+    # should have task still
+    assert wait_until(lambda: get_service_task('marathon', app_id) is None, 5)
+
+
 def teardown_module(module):
     client = marathon.create_client()
     client.remove_app("/unique-sleep")
+
+
+@pytest.fixture
+def root_created_apps():
+    """Collects the ids of the apps a test creates on the root marathon,
+    exactly those are removed after the test"""
+
+    app_ids = []
+    yield app_ids
+    remove_apps(marathon.create_client(), app_ids)
@@ -1,8 +1,11 @@
 import contextlib
+import fcntl
 import json
 import os
 import re
+import shutil
 import subprocess
+import tempfile
 from six.moves import urllib
 from dcos import http, util, config
 from dcos.errors import DCOSException
@@ -58,11 +61,49 @@ def marathon_on_marathon(name='marathon-user'):
     toml_config_o = config.get_config()
     dcos_url = config.get_config_val('core.dcos_url', toml_config_o)
     service_name = 'service/{}/'.format(name)
-    marathon_url = urllib.parse.urljoin(dcos_url, service_name)
-    config.set_val('marathon.url', marathon_url)
+    mom_url = urllib.parse.urljoin(dcos_url, service_name)
+    config.set_val('marathon.url', mom_url)
 
     try:
         yield
     finally:
         # return config to previous state
         config.save(toml_config_o)
+
+
+@contextlib.contextmanager
+def private_dcos_config():
+    """ Context manager pointing DCOS_CONFIG at a private copy of the dcos
+    config, marathon_on_marathon then only alters the config of this process
+    """
+
+    config_dir = tempfile.mkdtemp()
+    config_path = os.path.join(config_dir, 'dcos.toml')
+    shutil.copy2(config.get_config_path(), config_path)
+    previous = os.environ.get('DCOS_CONFIG')
+    os.environ['DCOS_CONFIG'] = config_path
+
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['DCOS_CONFIG']
+        else:
+            os.environ['DCOS_CONFIG'] = previous
+        shutil.rmtree(config_dir)
+
+
+@contextlib.contextmanager
+def file_lock(name):
+    """ Context manager holding an exclusive lock on a file in the temp dir,
+    shared by all the processes of a test run, e.g. the xdist workers
+    :param name: file name of the lock
+    :type name: str
+    """
+
+    with open(os.path.join(tempfile.gettempdir(), name), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)